@@ -3,40 +3,104 @@ from fastapi.responses import RedirectResponse, HTMLResponse, JSONResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
+from fastapi.concurrency import run_in_threadpool
 from starlette.middleware.sessions import SessionMiddleware
-from passlib.hash import bcrypt
 from typing import List, Optional
 import os
 import re
 import json
 import sqlite3
-import pandas as pd
+import time
+import threading
 from datetime import datetime
 import tempfile
-import shutil
+import hashlib
 from pathlib import Path
 
-# Import OCR utilities
-from utils.ocr_cloud import extract_text_from_pdf
-from utils.document_extractor import extract_document_details
+# Import OCR utilities (PyMuPDF and requests are imported lazily inside them)
+from utils.ocr_cloud import extract_text_with_status, DocumentTooLargeError, MAX_UPLOAD_BYTES, EXTRACTOR_VERSION
+from utils.document_extractor import extract_document_details, DOCUMENT_TYPES
+from utils.auth import hash_password, verify_password, AuthBusyError
 
 app = FastAPI(title="Permen - Document Analysis System")
 
+# Session secret - every worker must share the same key, so production mode
+# refuses to start with the development fallback
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+if not SESSION_SECRET:
+    if os.getenv("PERMEN_ENV") == "production":
+        raise RuntimeError("SESSION_SECRET must be set when PERMEN_ENV=production")
+    SESSION_SECRET = "rahasia-anda"
+
 # Middleware
-app.add_middleware(SessionMiddleware, secret_key=os.getenv("SESSION_SECRET", "rahasia-anda"))
+app.add_middleware(SessionMiddleware, secret_key=SESSION_SECRET)
+
+# Multipart framing and form fields sent along with the uploaded file
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """
+    Reject uploads whose Content-Length exceeds MAX_UPLOAD_BYTES before the
+    multipart body is received; extract_upload_text re-checks the spooled
+    size for requests without a Content-Length
+    """
+    if MAX_UPLOAD_BYTES and request.method == "POST" and request.url.path == "/analyze-document":
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD:
+            return JSONResponse(status_code=413, content={
+                "detail": f"Ukuran file melebihi batas {MAX_UPLOAD_BYTES // (1024 * 1024)} MB"
+            })
+    return await call_next(request)
 
 # Templates and static files - Fixed paths for Vercel
 templates = Jinja2Templates(directory="templates")
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Database setup
-DB_PATH = os.path.join(os.getcwd(), "histori_pemeriksaan.db")
+DB_PATH = os.getenv("DB_PATH", os.path.join(os.getcwd(), "histori_pemeriksaan.db"))
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", "30"))
+
+# OCR cache retention
+ANALYSIS_CACHE_TTL_SECONDS = int(os.getenv("ANALYSIS_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "1000"))
+
+# Login attempts allowed per username, and registrations per client IP,
+# within one window
+LOGIN_MAX_ATTEMPTS = int(os.getenv("LOGIN_MAX_ATTEMPTS", "10"))
+REGISTER_MAX_ATTEMPTS = int(os.getenv("REGISTER_MAX_ATTEMPTS", "5"))
+LOGIN_WINDOW_SECONDS = int(os.getenv("LOGIN_WINDOW_SECONDS", "300"))
+
+_db_ready = False
+_db_lock = threading.Lock()
+
+def get_db() -> sqlite3.Connection:
+    """
+    Open a connection to the shared SQLite database
+    Each request opens its own connection so the file can be shared safely
+    by several worker processes. The schema is created on first use.
+    """
+    ensure_db()
+    return sqlite3.connect(DB_PATH, timeout=DB_TIMEOUT)
+
+def ensure_db():
+    """Run init_db() once per process, on the first request that needs it"""
+    global _db_ready
+    if _db_ready:
+        return
+    with _db_lock:
+        if not _db_ready:
+            init_db()
+            _db_ready = True
 
 def init_db():
-    """Initialize SQLite database"""
-    conn = sqlite3.connect(DB_PATH)
+    """Initialize SQLite database (idempotent)"""
+    conn = sqlite3.connect(DB_PATH, timeout=DB_TIMEOUT)
     c = conn.cursor()
     
+    # WAL lets readers in one worker proceed while another worker writes
+    c.execute("PRAGMA journal_mode=WAL")
+    
     # Users table
     c.execute('''
         CREATE TABLE IF NOT EXISTS users (
@@ -60,11 +124,238 @@ def init_db():
         )
     ''')
     
+    # Aggregates over histori, maintained by update_stats() in the same
+    # transaction as each insert. scope is 'user' or 'assignment' (keyed by
+    # nomor_surat_tugas); dimension is 'total', 'jenis', 'instansi' or 'bulan'
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS histori_stats (
+            scope TEXT NOT NULL,
+            scope_key TEXT NOT NULL,
+            dimension TEXT NOT NULL,
+            value TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (scope, scope_key, dimension, value)
+        )
+    ''')
+    
+    # Rate limiting attempts shared by all workers; username holds the login
+    # username, or "register:<client ip>" for registrations
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS login_attempts (
+            username TEXT PRIMARY KEY,
+            window_start REAL NOT NULL,
+            attempts INTEGER NOT NULL
+        )
+    ''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_login_attempts_window ON login_attempts (window_start)")
+    
+    # OCR cache keyed by extractor version and file hash, shared by all workers
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_cache (
+            file_hash TEXT PRIMARY KEY,
+            text TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    conn.commit()
+    
+    # Backfill statistics for history analysed before histori_stats existed;
+    # the write lock keeps concurrent workers from doing it twice
+    c.execute("BEGIN IMMEDIATE")
+    stats_empty = c.execute("SELECT 1 FROM histori_stats LIMIT 1").fetchone() is None
+    has_history = c.execute("SELECT 1 FROM histori LIMIT 1").fetchone() is not None
+    if stats_empty and has_history:
+        _replay_stats(c)
+    conn.commit()
+    conn.close()
+
+def warm_up():
+    """
+    Import the heavy modules and create the schema ahead of time
+    Serverless cold starts skip this; the production server calls it in the
+    master process before forking workers (see gunicorn.conf.py)
+    """
+    import fitz  # noqa: F401
+    import requests  # noqa: F401
+    from passlib.hash import bcrypt
+    bcrypt.get_backend()
+    ensure_db()
+
+def _cache_key(file_hash: str) -> str:
+    return f"{EXTRACTOR_VERSION}:{file_hash}"
+
+def get_cached_text(file_hash: str) -> Optional[str]:
+    """Return previously extracted text for a file hash, if any and not expired"""
+    conn = get_db()
+    c = conn.cursor()
+    c.execute("""
+        SELECT text FROM analysis_cache
+        WHERE file_hash = ? AND created_at > datetime('now', ?)
+    """, (_cache_key(file_hash), f"-{ANALYSIS_CACHE_TTL_SECONDS} seconds"))
+    row = c.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def store_cached_text(file_hash: str, text: str):
+    """
+    Store extracted text; the first worker to finish wins
+    Expired entries are dropped and the table is trimmed to
+    ANALYSIS_CACHE_MAX_ENTRIES, oldest first
+    """
+    conn = get_db()
+    c = conn.cursor()
+    c.execute("INSERT OR IGNORE INTO analysis_cache (file_hash, text) VALUES (?, ?)", (_cache_key(file_hash), text))
+    c.execute("DELETE FROM analysis_cache WHERE created_at <= datetime('now', ?)",
+              (f"-{ANALYSIS_CACHE_TTL_SECONDS} seconds",))
+    c.execute("""
+        DELETE FROM analysis_cache WHERE file_hash NOT IN (
+            SELECT file_hash FROM analysis_cache ORDER BY created_at DESC, rowid DESC LIMIT ?
+        )
+    """, (ANALYSIS_CACHE_MAX_ENTRIES,))
+    conn.commit()
+    conn.close()
+
+def extract_upload_text(upload) -> str:
+    """
+    Copy an uploaded PDF to a temporary file, hashing it on the way, and
+    return its text, reusing a result cached by any worker if available
+    Blocking; run it in the thread pool. By the time it runs Starlette has
+    already spooled the whole body, so the size check here is only a
+    backstop for requests the Content-Length middleware could not judge.
+    """
+    file_hash = hashlib.sha256()
+    size = 0
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
+        tmp_path = tmp_file.name
+        for chunk in iter(lambda: upload.read(1024 * 1024), b""):
+            size += len(chunk)
+            if MAX_UPLOAD_BYTES and size > MAX_UPLOAD_BYTES:
+                break
+            file_hash.update(chunk)
+            tmp_file.write(chunk)
+    
+    try:
+        if MAX_UPLOAD_BYTES and size > MAX_UPLOAD_BYTES:
+            raise DocumentTooLargeError(f"Ukuran file melebihi batas {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+        
+        file_hash = file_hash.hexdigest()
+        text = get_cached_text(file_hash)
+        if text is None:
+            text, complete = extract_text_with_status(tmp_path)
+            # Partial OCR results are not cached so a re-upload retries them
+            if complete and text.strip():
+                store_cached_text(file_hash, text)
+        return text
+    finally:
+        os.unlink(tmp_path)
+
+def register_attempt(key: str, max_attempts: int) -> bool:
+    """
+    Count an attempt for key in the current fixed window
+    Returns False once key has exceeded max_attempts, before any password
+    hashing is done for the attempt. Expired rows are removed on the way.
+    Blocking; call it through run_in_threadpool from async handlers.
+    """
+    now = time.time()
+    expired = now - LOGIN_WINDOW_SECONDS
+    conn = get_db()
+    c = conn.cursor()
+    c.execute("DELETE FROM login_attempts WHERE window_start <= ?", (expired,))
+    c.execute("""
+        INSERT INTO login_attempts (username, window_start, attempts) VALUES (?, ?, 1)
+        ON CONFLICT(username) DO UPDATE SET attempts = attempts + 1
+    """, (key, now))
+    c.execute("SELECT attempts FROM login_attempts WHERE username = ?", (key,))
+    attempts = c.fetchone()[0]
     conn.commit()
     conn.close()
+    return attempts <= max_attempts
+
+def register_login_attempt(username: str) -> bool:
+    """Count a login attempt for username (LOGIN_MAX_ATTEMPTS per window)"""
+    return register_attempt(username, LOGIN_MAX_ATTEMPTS)
+
+def register_registration_attempt(client_ip: str) -> bool:
+    """Count a registration from client_ip (REGISTER_MAX_ATTEMPTS per window)"""
+    return register_attempt(f"register:{client_ip}", REGISTER_MAX_ATTEMPTS)
+
+def get_password_hash(username: str) -> Optional[str]:
+    """Return the stored password hash for username, if the user exists"""
+    conn = get_db()
+    c = conn.cursor()
+    c.execute("SELECT password FROM users WHERE username=?", (username,))
+    row = c.fetchone()
+    conn.close()
+    return row[0] if row else None
+
+def update_password_hash(username: str, password_hash: str):
+    """Replace the stored password hash for username"""
+    conn = get_db()
+    conn.execute("UPDATE users SET password = ? WHERE username = ?", (password_hash, username))
+    conn.commit()
+    conn.close()
+
+def update_stats(c: sqlite3.Cursor, user: str, nomor_surat_tugas: str,
+                 instansi_terperiksa: str, waktu: str, hasil: dict):
+    """
+    Add one analysed document to histori_stats
+    Must run on the cursor that inserts the histori row, before commit
+    """
+    values = [("total", ""), ("instansi", instansi_terperiksa), ("bulan", waktu[:7])]
+    values += [("jenis", doc_type) for doc_type in DOCUMENT_TYPES if hasil.get(doc_type) == "Ada"]
+    rows = [
+        (scope, scope_key, dimension, value)
+        for scope, scope_key in (("user", user), ("assignment", nomor_surat_tugas))
+        for dimension, value in values
+    ]
+    c.executemany("""
+        INSERT INTO histori_stats (scope, scope_key, dimension, value, count) VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT(scope, scope_key, dimension, value) DO UPDATE SET count = count + 1
+    """, rows)
+
+def get_stats(scope: str, scope_key: str) -> dict:
+    """Read the precomputed breakdown for one user or assignment"""
+    conn = get_db()
+    c = conn.cursor()
+    c.execute("SELECT dimension, value, count FROM histori_stats WHERE scope = ? AND scope_key = ?",
+              (scope, scope_key))
+    rows = c.fetchall()
+    conn.close()
 
-# Initialize database on startup
-init_db()
+    stats = {"total": 0, "per_jenis": {}, "per_instansi": {}, "per_bulan": {}}
+    for dimension, value, count in rows:
+        if dimension == "total":
+            stats["total"] = count
+        else:
+            stats[f"per_{dimension}"][value] = count
+    return stats
+
+def rebuild_stats() -> int:
+    """
+    Recompute histori_stats from every histori row, e.g. to backfill rows
+    analysed before the table existed. Returns the number of rows processed.
+    """
+    conn = get_db()
+    c = conn.cursor()
+    # Hold the write lock so no insert lands between the wipe and the replay
+    c.execute("BEGIN IMMEDIATE")
+    count = _replay_stats(c)
+    conn.commit()
+    conn.close()
+    return count
+
+def _replay_stats(c: sqlite3.Cursor) -> int:
+    """Wipe histori_stats and replay every histori row into it on cursor c"""
+    c.execute("DELETE FROM histori_stats")
+    rows = c.execute("SELECT user, nomor_surat_tugas, instansi_terperiksa, waktu, hasil_analisis FROM histori").fetchall()
+    for user, nomor_surat_tugas, instansi_terperiksa, waktu, hasil_analisis in rows:
+        try:
+            hasil = json.loads(hasil_analisis or "{}")
+        except ValueError:
+            hasil = {}
+        update_stats(c, user, nomor_surat_tugas, instansi_terperiksa, str(waktu or ""), hasil)
+    return len(rows)
 
 # Authentication dependency
 def get_current_user(request: Request):
@@ -95,15 +386,29 @@ async def login_post(request: Request, username: str = Form(...), password: str
             "error": "Email harus menggunakan domain @bpk.go.id"
         })
 
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT password FROM users WHERE username=?", (username.lower(),))
-    row = c.fetchone()
-    conn.close()
+    if not await run_in_threadpool(register_login_attempt, username.lower()):
+        return templates.TemplateResponse("login.html", {
+            "request": request,
+            "error": "Terlalu banyak percobaan login. Silakan coba lagi beberapa menit lagi."
+        }, status_code=429)
 
-    if row and bcrypt.verify(password, row[0]):
-        request.session['user'] = username.lower()
-        return RedirectResponse(url="/dashboard", status_code=302)
+    stored_hash = await run_in_threadpool(get_password_hash, username.lower())
+
+    if stored_hash:
+        try:
+            valid, new_hash = await verify_password(password, stored_hash)
+        except AuthBusyError:
+            return templates.TemplateResponse("login.html", {
+                "request": request,
+                "error": "Server sedang sibuk. Silakan coba lagi."
+            }, status_code=503)
+
+        if valid:
+            if new_hash:
+                # Cost factor changed since this hash was made
+                await run_in_threadpool(update_password_hash, username.lower(), new_hash)
+            request.session['user'] = username.lower()
+            return RedirectResponse(url="/dashboard", status_code=302)
 
     return templates.TemplateResponse("login.html", {
         "request": request,
@@ -128,10 +433,24 @@ async def register_user(
             "error": "Email harus menggunakan domain @bpk.go.id"
         })
     
-    conn = sqlite3.connect(DB_PATH)
+    client_ip = request.client.host if request.client else "unknown"
+    if not await run_in_threadpool(register_registration_attempt, client_ip):
+        return templates.TemplateResponse("register.html", {
+            "request": request,
+            "error": "Terlalu banyak pendaftaran. Silakan coba lagi beberapa menit lagi."
+        }, status_code=429)
+    
+    try:
+        hashed_password = await hash_password(password)
+    except AuthBusyError:
+        return templates.TemplateResponse("register.html", {
+            "request": request,
+            "error": "Server sedang sibuk. Silakan coba lagi."
+        }, status_code=503)
+
+    conn = get_db()
     c = conn.cursor()
     try:
-        hashed_password = bcrypt.hash(password)
         c.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username.lower(), hashed_password))
         conn.commit()
     except sqlite3.IntegrityError:
@@ -155,7 +474,8 @@ async def dashboard(request: Request):
     user = get_current_user(request)
     return templates.TemplateResponse("dashboard.html", {
         "request": request,
-        "user": user
+        "user": user,
+        "stats": get_stats("user", user)
     })
 
 @app.get("/upload", response_class=HTMLResponse)
@@ -180,63 +500,61 @@ async def analyze_document(
     if not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
-    # Save uploaded file temporarily
-    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_file:
-        shutil.copyfileobj(file.file, tmp_file)
-        tmp_path = tmp_file.name
-    
+    # Extract text from PDF
     try:
-        # Extract text from PDF
-        try:
-            text = extract_text_from_pdf(tmp_path)
-        except Exception as e:
-            return templates.TemplateResponse("upload.html", {
-                "request": request,
-                "user": user,
-                "error": f"Gagal melakukan OCR: {str(e)}"
-            })
-
-        # Analyze document
-        try:
-            analysis_result = extract_document_details(text)
-        except Exception as e:
-            return templates.TemplateResponse("upload.html", {
-                "request": request,
-                "user": user,
-                "error": f"Gagal menganalisis dokumen: {str(e)}"
-            })
-
-        analysis_result['nama_file'] = file.filename
-        analysis_result['user'] = user
-        analysis_result['nomor_surat_tugas'] = nomor_surat_tugas
-        analysis_result['instansi_terperiksa'] = instansi_terperiksa
-        analysis_result['waktu'] = datetime.now().isoformat()
-
-        # Save to database
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute("""
-            INSERT INTO histori (user, nomor_surat_tugas, instansi_terperiksa, nama_file, hasil_analisis, waktu)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (user, nomor_surat_tugas, instansi_terperiksa, file.filename, json.dumps(analysis_result), analysis_result['waktu']))
-        conn.commit()
-        conn.close()
+        text = await run_in_threadpool(extract_upload_text, file.file)
+    except DocumentTooLargeError as e:
+        return templates.TemplateResponse("upload.html", {
+            "request": request,
+            "user": user,
+            "error": f"Dokumen terlalu besar: {str(e)}"
+        }, status_code=413)
+    except Exception as e:
+        return templates.TemplateResponse("upload.html", {
+            "request": request,
+            "user": user,
+            "error": f"Gagal melakukan OCR: {str(e)}"
+        })
 
-        return templates.TemplateResponse("hasil.html", {
+    # Analyze document
+    try:
+        analysis_result = extract_document_details(text)
+    except Exception as e:
+        return templates.TemplateResponse("upload.html", {
             "request": request,
-            "hasil": analysis_result,
-            "user": user
+            "user": user,
+            "error": f"Gagal menganalisis dokumen: {str(e)}"
         })
-    finally:
-        # Clean up temporary file
-        os.unlink(tmp_path)
+
+    analysis_result['nama_file'] = file.filename
+    analysis_result['user'] = user
+    analysis_result['nomor_surat_tugas'] = nomor_surat_tugas
+    analysis_result['instansi_terperiksa'] = instansi_terperiksa
+    analysis_result['waktu'] = datetime.now().isoformat()
+
+    # Save to database
+    conn = get_db()
+    c = conn.cursor()
+    c.execute("""
+        INSERT INTO histori (user, nomor_surat_tugas, instansi_terperiksa, nama_file, hasil_analisis, waktu)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (user, nomor_surat_tugas, instansi_terperiksa, file.filename, json.dumps(analysis_result), analysis_result['waktu']))
+    update_stats(c, user, nomor_surat_tugas, instansi_terperiksa, analysis_result['waktu'], analysis_result)
+    conn.commit()
+    conn.close()
+
+    return templates.TemplateResponse("hasil.html", {
+        "request": request,
+        "hasil": analysis_result,
+        "user": user
+    })
 
 @app.get("/history", response_class=HTMLResponse)
 async def history(request: Request):
     """View analysis history"""
     user = get_current_user(request)
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     c = conn.cursor()
     c.execute("SELECT * FROM histori WHERE user = ? ORDER BY waktu DESC LIMIT 50", (user,))
     history_data = c.fetchall()
@@ -252,12 +570,7 @@ async def history(request: Request):
 async def profile(request: Request):
     """User profile page"""
     user = get_current_user(request)
-    
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    c.execute("SELECT COUNT(*) FROM histori WHERE user = ?", (user,))
-    total_analyses = c.fetchone()[0]
-    conn.close()
+    total_analyses = get_stats("user", user)["total"]
     
     return templates.TemplateResponse("profile.html", {
         "request": request,
@@ -280,3 +593,15 @@ async def get_user_info(request: Request):
     
     return {"user": user}
 
+@app.get("/api/stats")
+async def user_stats(request: Request):
+    """Document counts for the current user per type, instansi and month"""
+    user = get_current_user(request)
+    return {"user": user, **get_stats("user", user)}
+
+@app.get("/api/stats/assignment")
+async def assignment_stats(request: Request, nomor_surat_tugas: str):
+    """Document counts for one assignment (nomor surat tugas) across all users"""
+    get_current_user(request)
+    return {"nomor_surat_tugas": nomor_surat_tugas, **get_stats("assignment", nomor_surat_tugas)}
+
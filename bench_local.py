@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Local benchmark script for Permen application
+
+    python bench_local.py               # run every benchmark
+    python bench_local.py scaling       # run a single benchmark by name
+"""
+
+import os
+import sys
+import time
+import socket
+import tempfile
+import subprocess
+import http.client
+import urllib.parse
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+# Add project root to Python path
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+BENCH_USER = "bench@bpk.go.id"
+BENCH_PASSWORD = "bench-password"
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _request(port: int, method: str, path: str, fields: dict = None) -> int:
+    """Send one request without following redirects, return the status code"""
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    body = urllib.parse.urlencode(fields) if fields else None
+    headers = {"Content-Type": "application/x-www-form-urlencoded"} if fields else {}
+    conn.request(method, path, body=body, headers=headers)
+    status = conn.getresponse().status
+    conn.close()
+    return status
+
+def _start_server(workers: int, db_path: str):
+    """Start the production profile and wait until it answers health checks"""
+    port = _free_port()
+    # One hashing thread per worker, so throughput scales with processes only
+    env = dict(os.environ, DB_PATH=db_path, SESSION_SECRET="bench-secret", LOG_LEVEL="warning",
+               LOGIN_MAX_ATTEMPTS="1000000", REGISTER_MAX_ATTEMPTS="1000000", AUTH_WORKERS="1")
+    proc = subprocess.Popen(
+        [sys.executable, "run.py", "--production", "--workers", str(workers),
+         "--host", "127.0.0.1", "--port", str(port)],
+        cwd=project_root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if _request(port, "GET", "/api/health") == 200:
+                return proc, port
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+def bench_scaling(worker_counts=None, requests_per_run: int = 48, concurrency: int = 16):
+    """
+    Login throughput (bcrypt-bound) of the production profile per worker count
+    Each worker hashes on a single thread, so the speedup comes from processes
+    """
+    cpus = os.cpu_count() or 1
+    worker_counts = worker_counts or sorted({1, 2, max(1, cpus // 2), cpus})
+    db_path = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+    results = {}
+    try:
+        for workers in worker_counts:
+            proc, port = _start_server(workers, db_path)
+            try:
+                _request(port, "POST", "/register", {"username": BENCH_USER, "password": BENCH_PASSWORD})
+                fields = {"username": BENCH_USER, "password": BENCH_PASSWORD}
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    statuses = list(pool.map(lambda _: _request(port, "POST", "/login", fields), range(requests_per_run)))
+                elapsed = time.perf_counter() - start
+            finally:
+                proc.terminate()
+                proc.wait()
+            assert all(status == 302 for status in statuses), statuses
+            results[workers] = requests_per_run / elapsed
+            speedup = results[workers] / results[worker_counts[0]]
+            print(f"   workers={workers:<3} {results[workers]:8.1f} logins/s  {speedup:4.2f}x")
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+    return results
+
+def bench_login(requests_per_run: int = 32, concurrency: int = 16, probes: int = 20):
+    """Login throughput of one worker and event-loop latency seen by other requests meanwhile"""
+    db_path = tempfile.NamedTemporaryFile(suffix=".db", delete=False).name
+    proc, port = _start_server(1, db_path)
+    try:
+        _request(port, "POST", "/register", {"username": BENCH_USER, "password": BENCH_PASSWORD})
+        fields = {"username": BENCH_USER, "password": BENCH_PASSWORD}
+
+        def probe():
+            latencies = []
+            for _ in range(probes):
+                start = time.perf_counter()
+                _request(port, "GET", "/api/health")
+                latencies.append(time.perf_counter() - start)
+                time.sleep(0.05)
+            return sorted(latencies)
+
+        with ThreadPoolExecutor(max_workers=concurrency + 1) as pool:
+            start = time.perf_counter()
+            latencies = pool.submit(probe)
+            statuses = list(pool.map(lambda _: _request(port, "POST", "/login", fields), range(requests_per_run)))
+            elapsed = time.perf_counter() - start
+            latencies = latencies.result()
+    finally:
+        proc.terminate()
+        proc.wait()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+    assert all(status == 302 for status in statuses), statuses
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000
+    print(f"   {requests_per_run / elapsed:8.1f} logins/s, /api/health p95 {p95:.1f} ms during logins")
+    return requests_per_run / elapsed, p95
+
+def bench_keywords(sizes=(100_000, 1_000_000, 4_000_000)):
+    """Time to detect every marker in synthetic OCR text of growing size"""
+    import random
+    from utils.document_extractor import _MARKER_MATCHER
+    from utils.fuzzy_match import normalize_text
+
+    # Ordinary vocabulary with the words markers are built from mixed in, so
+    # the q-gram filter keeps producing candidates that need verification
+    words = ("yang", "dan", "untuk", "dengan", "pada", "tahun", "anggaran", "kegiatan", "belanja",
+             "barang", "jasa", "sesuai", "dokumen", "Kepala", "Dinas", "bendahara", "Nomor", "Tanggal",
+             "Rp", "1.250.000,00", "2024", "SURAT", "PERINTAH", "PEMBAYARAN", "DANA", "BERITA",
+             "kerja", "SATKER", "pekerjaan")
+    rng = random.Random(0)
+    results = {}
+    for size in sizes:
+        parts, length = [], 0
+        while length < size:
+            word = rng.choice(words)
+            parts.append(word)
+            length += len(word) + 1
+        text = " ".join(parts) + " KW1TANSI"
+        start = time.perf_counter()
+        normalized = normalize_text(text)
+        found = _MARKER_MATCHER.find(normalized, normalized=True)
+        elapsed = time.perf_counter() - start
+        assert "KWITANSI" in found, found
+        results[size] = elapsed
+        print(f"   {size / 1e6:5.1f}M chars {elapsed * 1000:8.1f} ms  ({size / elapsed / 1e6:.1f}M chars/s)")
+    return results
+
+BENCHMARKS = {
+    "scaling": bench_scaling,
+    "login": bench_login,
+    "keywords": bench_keywords,
+}
+
+def main():
+    """Main benchmark function"""
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"\n⏱️  Benchmark: {name}")
+        BENCHMARKS[name]()
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
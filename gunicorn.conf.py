@@ -0,0 +1,30 @@
+"""
+Gunicorn configuration for the Permen production profile
+
+The app is preloaded in the master process, and on_starting() imports the
+modules the routes load lazily (PyMuPDF, passlib, requests), so they are
+imported once and shared by the forked workers. All shared state (users,
+history, OCR cache) lives in the SQLite file at DB_PATH, never in a worker.
+PERMEN_ENV defaults to production here, so starting gunicorn directly still
+requires SESSION_SECRET.
+"""
+
+import os
+import multiprocessing
+
+os.environ.setdefault("PERMEN_ENV", "production")
+
+wsgi_app = "api.index:app"
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("WORKER_TIMEOUT", "120"))
+graceful_timeout = 30
+accesslog = "-"
+loglevel = os.getenv("LOG_LEVEL", "info")
+
+def on_starting(server):
+    """Import the lazily loaded heavy modules in the master before fork"""
+    from api.index import warm_up
+    warm_up()
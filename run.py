@@ -1,16 +1,56 @@
 #!/usr/bin/env python3
 """
-Local development server for Permen application
+Server launcher for Permen application
+
+    python run.py                 # local development server with auto-reload
+    python run.py --production    # multi-worker gunicorn server (see gunicorn.conf.py)
+    python run.py --rebuild-stats # recompute dashboard/profile statistics from history
 """
 
-import uvicorn
-from api.index import app
+import os
+import sys
+import argparse
+
+def run_development(host: str, port: int):
+    """Single uvicorn process with auto-reload"""
+    import uvicorn
 
-if __name__ == "__main__":
     uvicorn.run(
         "api.index:app",
-        host="0.0.0.0",
-        port=8000,
+        host=host,
+        port=port,
         reload=True,
         log_level="info"
-    ) 
\ No newline at end of file
+    )
+
+def rebuild_stats():
+    """Backfill the statistics table from existing history rows"""
+    from api.index import rebuild_stats
+
+    print(f"Rebuilt statistics from {rebuild_stats()} history rows")
+
+def run_production(host: str, port: int, workers: int = None):
+    """Replace this process with gunicorn using the production profile"""
+    os.environ["PERMEN_ENV"] = "production"
+    os.environ["BIND"] = f"{host}:{port}"
+    if workers:
+        os.environ["WEB_CONCURRENCY"] = str(workers)
+
+    config = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.conf.py")
+    os.execvp(sys.executable, [sys.executable, "-m", "gunicorn", "-c", config])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Permen server")
+    parser.add_argument("--production", action="store_true", help="multi-worker server without reload")
+    parser.add_argument("--rebuild-stats", action="store_true", help="recompute statistics from history and exit")
+    parser.add_argument("--workers", type=int, help="worker count for --production (default: CPU count)")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    if args.rebuild_stats:
+        rebuild_stats()
+    elif args.production:
+        run_production(args.host, args.port, args.workers)
+    else:
+        run_development(args.host, args.port)
@@ -4,8 +4,11 @@ Local testing script for Permen application
 """
 
 import os
+import re
+import json
 import sys
 import tempfile
+import subprocess
 import shutil
 from pathlib import Path
 
@@ -31,6 +34,9 @@ def cleanup_test_environment(db_path):
     """Cleanup test environment"""
     try:
         os.unlink(db_path)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
         print(f"✅ Cleaned up temporary database: {db_path}")
     except Exception as e:
         print(f"⚠️  Warning: Could not cleanup {db_path}: {e}")
@@ -58,6 +64,360 @@ def test_database_initialization():
         print(f"❌ Database initialization error: {e}")
         return False
 
+def test_database_path():
+    """Test that DB_PATH from the environment is honoured"""
+    try:
+        from api.index import DB_PATH
+        if DB_PATH != os.environ['DB_PATH']:
+            print(f"❌ DB_PATH not honoured: {DB_PATH}")
+            return False
+        print(f"✅ Database path configured: {DB_PATH}")
+        return True
+    except Exception as e:
+        print(f"❌ Database path error: {e}")
+        return False
+
+def test_analysis_cache():
+    """Test the shared OCR cache round trip, expiry and size cap"""
+    try:
+        import api.index as index
+        index.store_cached_text("test-hash", "first")
+        index.store_cached_text("test-hash", "second")
+        if index.get_cached_text("test-hash") != "first" or index.get_cached_text("missing") is not None:
+            print("❌ Analysis cache returned unexpected values")
+            return False
+
+        original = (index.ANALYSIS_CACHE_TTL_SECONDS, index.ANALYSIS_CACHE_MAX_ENTRIES)
+        try:
+            index.ANALYSIS_CACHE_MAX_ENTRIES = 2
+            for n in range(3):
+                index.store_cached_text(f"cap-{n}", "teks")
+            if index.get_cached_text("cap-0") is not None or index.get_cached_text("cap-2") != "teks":
+                print("❌ Analysis cache was not trimmed to its size cap")
+                return False
+
+            index.ANALYSIS_CACHE_TTL_SECONDS = 0
+            if index.get_cached_text("cap-2") is not None:
+                print("❌ Expired analysis cache entry was returned")
+                return False
+        finally:
+            index.ANALYSIS_CACHE_TTL_SECONDS, index.ANALYSIS_CACHE_MAX_ENTRIES = original
+        print("✅ Analysis cache works")
+        return True
+    except Exception as e:
+        print(f"❌ Analysis cache error: {e}")
+        return False
+
+def test_partial_ocr_status():
+    """Test that a PDF with a failed OCR page is reported as incomplete"""
+    try:
+        import fitz
+        import utils.ocr_cloud as ocr
+        results = iter(["halaman satu", ""])
+        original = ocr.call_cloud_ocr
+        ocr.call_cloud_ocr = lambda img_base64: next(results)
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                pdf_path = os.path.join(tmp_dir, 'scan.pdf')
+                doc = fitz.open()
+                doc.new_page()
+                doc.new_page()
+                doc.save(pdf_path)
+                doc.close()
+                text, complete = ocr.extract_text_with_status(pdf_path)
+        finally:
+            ocr.call_cloud_ocr = original
+        if "halaman satu" not in text or complete:
+            print(f"❌ Partial OCR reported as complete: {text!r}")
+            return False
+        print("✅ Partial OCR results are flagged")
+        return True
+    except Exception as e:
+        print(f"❌ Partial OCR status error: {e}")
+        return False
+
+def test_text_limit():
+    """Test that extraction stops once a document exceeds MAX_TEXT_CHARS"""
+    try:
+        import fitz
+        import utils.ocr_cloud as ocr
+        original = ocr.MAX_TEXT_CHARS
+        ocr.MAX_TEXT_CHARS = 1000
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                pdf_path = os.path.join(tmp_dir, 'long.pdf')
+                doc = fitz.open()
+                for _ in range(5):
+                    doc.new_page().insert_text((72, 72), "KWITANSI\n" * 40)
+                doc.save(pdf_path)
+                doc.close()
+                try:
+                    ocr.extract_text_with_status(pdf_path)
+                except ocr.DocumentTooLargeError:
+                    print("✅ Text beyond MAX_TEXT_CHARS is rejected")
+                    return True
+        finally:
+            ocr.MAX_TEXT_CHARS = original
+        print("❌ Text beyond MAX_TEXT_CHARS was accepted")
+        return False
+    except Exception as e:
+        print(f"❌ Text limit error: {e}")
+        return False
+
+# Cold-start budget for `import api.index`, in milliseconds
+IMPORT_TIME_BUDGET_MS = int(os.getenv('IMPORT_TIME_BUDGET_MS', '1000'))
+# Modules that must only be imported by the routes that use them
+LAZY_MODULES = ('fitz', 'pandas', 'passlib', 'requests')
+
+def test_import_time():
+    """Test cold-start import cost with python -X importtime"""
+    try:
+        env = dict(os.environ, DB_PATH=os.path.join(tempfile.gettempdir(), 'permen-importtime.db'))
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', 'import api.index'],
+            cwd=project_root, env=env, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            print(f"❌ Import failed: {proc.stderr.splitlines()[-1]}")
+            return False
+
+        cumulative = {}
+        for line in proc.stderr.splitlines():
+            match = re.match(r'import time:\s+\d+ \|\s+(\d+) \| (\s*)(\S+)', line)
+            if match:
+                cumulative[match.group(3)] = int(match.group(1))
+
+        eager = [name for name in LAZY_MODULES if name in cumulative]
+        if eager:
+            print(f"❌ Imported at startup: {', '.join(eager)}")
+            return False
+        if os.path.exists(env['DB_PATH']):
+            os.unlink(env['DB_PATH'])
+            print("❌ Database initialized at import time")
+            return False
+
+        total_ms = cumulative['api.index'] / 1000
+        if total_ms > IMPORT_TIME_BUDGET_MS:
+            print(f"❌ import api.index took {total_ms:.0f} ms (budget {IMPORT_TIME_BUDGET_MS} ms)")
+            return False
+        print(f"✅ import api.index took {total_ms:.0f} ms (budget {IMPORT_TIME_BUDGET_MS} ms)")
+        return True
+    except Exception as e:
+        print(f"❌ Import time error: {e}")
+        return False
+
+def test_password_hashing():
+    """Test off-loop hashing and rehash when the cost factor changes"""
+    try:
+        import asyncio
+        import utils.auth as auth
+        original_rounds = auth.BCRYPT_ROUNDS
+        try:
+            auth.BCRYPT_ROUNDS = 4
+            hashed = asyncio.run(auth.hash_password("rahasia"))
+            valid, new_hash = asyncio.run(auth.verify_password("rahasia", hashed))
+            wrong, _ = asyncio.run(auth.verify_password("salah", hashed))
+            if not valid or wrong or new_hash is not None:
+                print("❌ Password verification returned unexpected values")
+                return False
+
+            auth.BCRYPT_ROUNDS = 5
+            valid, new_hash = asyncio.run(auth.verify_password("rahasia", hashed))
+            if not valid or not new_hash or not new_hash.startswith("$2b$05$"):
+                print("❌ Hash was not upgraded to the new cost factor")
+                return False
+        finally:
+            auth.BCRYPT_ROUNDS = original_rounds
+        print("✅ Password hashing and rehash work")
+        return True
+    except Exception as e:
+        print(f"❌ Password hashing error: {e}")
+        return False
+
+def test_login_rate_limit():
+    """Test per-user login and per-IP registration limiting and cleanup"""
+    try:
+        import api.index as index
+        allowed = [index.register_login_attempt("ratelimit@bpk.go.id") for _ in range(index.LOGIN_MAX_ATTEMPTS + 1)]
+        if allowed != [True] * index.LOGIN_MAX_ATTEMPTS + [False]:
+            print(f"❌ Unexpected rate limit decisions: {allowed}")
+            return False
+        if not index.register_login_attempt("other@bpk.go.id"):
+            print("❌ Rate limit leaked across users")
+            return False
+
+        allowed = [index.register_registration_attempt("10.0.0.1") for _ in range(index.REGISTER_MAX_ATTEMPTS + 1)]
+        if allowed != [True] * index.REGISTER_MAX_ATTEMPTS + [False]:
+            print(f"❌ Unexpected registration limit decisions: {allowed}")
+            return False
+
+        original_window = index.LOGIN_WINDOW_SECONDS
+        try:
+            index.LOGIN_WINDOW_SECONDS = 0
+            index.register_login_attempt("cleanup@bpk.go.id")
+        finally:
+            index.LOGIN_WINDOW_SECONDS = original_window
+        conn = index.get_db()
+        remaining = conn.execute("SELECT COUNT(*) FROM login_attempts").fetchone()[0]
+        conn.close()
+        if remaining != 1:
+            print(f"❌ Expired login attempts were not removed ({remaining} rows left)")
+            return False
+        print("✅ Login rate limit works")
+        return True
+    except Exception as e:
+        print(f"❌ Login rate limit error: {e}")
+        return False
+
+def test_statistics():
+    """Test incremental statistics against a full rebuild"""
+    try:
+        from api.index import get_db, init_db, update_stats, get_stats, rebuild_stats
+        rows = [
+            ("stats@bpk.go.id", "ST-1/2024", "Dinas A", "2024-01-15T10:00:00", {"SPM": "Ada", "SP2D": "Tidak Ada"}),
+            ("stats@bpk.go.id", "ST-1/2024", "Dinas B", "2024-02-01T09:00:00", {"SPM": "Ada", "SP2D": "Ada"}),
+            ("lain@bpk.go.id", "ST-1/2024", "Dinas A", "2024-02-03T08:00:00", {"KWITANSI": "Ada"}),
+        ]
+        conn = get_db()
+        c = conn.cursor()
+        for user, nomor, instansi, waktu, hasil in rows:
+            c.execute("""
+                INSERT INTO histori (user, nomor_surat_tugas, instansi_terperiksa, nama_file, hasil_analisis, waktu)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (user, nomor, instansi, "a.pdf", json.dumps(hasil), waktu))
+            update_stats(c, user, nomor, instansi, waktu, hasil)
+        conn.commit()
+        conn.close()
+
+        incremental = (get_stats("user", "stats@bpk.go.id"), get_stats("assignment", "ST-1/2024"))
+        expected_user = {
+            "total": 2,
+            "per_jenis": {"SPM": 2, "SP2D": 1},
+            "per_instansi": {"Dinas A": 1, "Dinas B": 1},
+            "per_bulan": {"2024-01": 1, "2024-02": 1},
+        }
+        if incremental[0] != expected_user or incremental[1]["total"] != 3:
+            print(f"❌ Unexpected statistics: {incremental}")
+            return False
+
+        rebuild_stats()
+        rebuilt = (get_stats("user", "stats@bpk.go.id"), get_stats("assignment", "ST-1/2024"))
+        if rebuilt != incremental:
+            print(f"❌ Rebuild differs from incremental statistics: {rebuilt}")
+            return False
+
+        # An existing deployment with history but no statistics is backfilled
+        conn = get_db()
+        conn.execute("DELETE FROM histori_stats")
+        conn.commit()
+        conn.close()
+        init_db()
+        if get_stats("user", "stats@bpk.go.id") != incremental[0]:
+            print("❌ init_db() did not backfill empty statistics")
+            return False
+        print("✅ Statistics work")
+        return True
+    except Exception as e:
+        print(f"❌ Statistics error: {e}")
+        return False
+
+# Noisy OCR output and the document types it must (and must only) produce
+NOISY_OCR_SAMPLES = [
+    ("SURAT  PERINTAH\nPENCA1RAN  DANA\nNomor : 00123/SP2D/01.02.03.04/2024", {"SP2D"}),
+    ("KW1TANSI\nTelah terima dari Bendahara Pengeluaran", {"KWITANSI"}),
+    ("K U I T A N S I  No. 12", {"KWITANSI"}),
+    ("KWITANSÍ pembayaran honorarium", {"KWITANSI"}),
+    ("BER1TA ACARA SERAH TER|MA PEKERJAAN", {"BAST"}),
+    ("BERITA ACARA PENYELESAlAN PEKERJAAN", {"BAPP"}),
+    ("BERITAACARA PEMBAYARAN", {"BA_PEMBAYARAN"}),
+    ("SURAT PERINTAH MEMBAVAR\nNomor 123 Tanggal 01-Jan-2024", {"SPM"}),
+    ("SURAT PERM1NTAAN PEMBAYARAN", {"SPP"}),
+    # Near misses: edits may not cross word boundaries or merge words
+    ("SURAT PERINTAH PEMBAYARAN", set()),
+    ("Berita acara rapat; pembayar dan penerima hadir", set()),
+    ("BERITA ACARA RAPAT\nPEMBAYAR ANGGARAN", set()),
+    ("BERITA ACARA\nKepala Dinas memberi perintah membayar honor", set()),
+    ("SURATPERINTAHKERJA (SPK)", {"SPK"}),
+    ("SURAT PERINTAH MULAl KERJA", {"SPMK"}),
+    ("INV0ICE #991", {"INVOICE"}),
+    ("INVOlCE #992", {"INVOICE"}),
+    ("KEPUTUSAN KEPALA DINAS\nMen1mbang : a\nMengingat: b\nMENETAPKAN: c", {"SK"}),
+    ("SURAT TUGAS\nKepala Dinas menugaskan kepada", {"SURAT_TUGAS"}),
+    ("SURAT PERJANJ1AN KERJA SAMA ... KONTRAK", {"SURAT_PERJANJIAN", "KONTRAK"}),
+    ("DAFTAR SP2D SATKER 2024", {"DAFTAR_SP2D"}),
+    ("Laporan keuangan tahunan tanpa dokumen pendukung", set()),
+    ("Surat undangan rapat koordinasi", set()),
+]
+
+def test_keyword_detection():
+    """Test document type detection on noisy OCR samples"""
+    try:
+        from utils.document_extractor import extract_document_details, DOCUMENT_TYPES
+        misses = []
+        for text, expected in NOISY_OCR_SAMPLES:
+            result = extract_document_details(text)
+            detected = {doc_type for doc_type in DOCUMENT_TYPES if result[doc_type] == "Ada"}
+            if detected != expected:
+                misses.append((text, detected, expected))
+        for text, detected, expected in misses:
+            print(f"❌ {text!r}: detected {sorted(detected)}, expected {sorted(expected)}")
+        if misses:
+            return False
+        print(f"✅ {len(NOISY_OCR_SAMPLES)} noisy OCR samples detected correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Keyword detection error: {e}")
+        return False
+
+# Peak RSS allowed while OCR-ing the synthetic scanned PDF below, in MB
+LARGE_PDF_RSS_BUDGET_MB = int(os.getenv('LARGE_PDF_RSS_BUDGET_MB', '100'))
+
+GENERATE_LARGE_PDF = """
+import sys, fitz
+doc = fitz.open()
+for i in range(int(sys.argv[2])):
+    # Small page, big unique image: cheap to render, 16 MB once decoded
+    page = doc.new_page(width=200, height=280)
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 2000, 2800), False)
+    pix.set_rect(pix.irect, ((i * 37) % 256, (i * 91) % 256, (i * 13) % 256))
+    page.insert_image(page.rect, pixmap=pix)
+doc.save(sys.argv[1], deflate=True)
+"""
+
+MEASURE_LARGE_PDF = """
+import sys, resource
+import utils.ocr_cloud as ocr
+ocr.call_cloud_ocr = lambda img_base64: "halaman"
+text = ocr.extract_text_with_cloud_ocr(sys.argv[1])
+assert text.count("halaman") == int(sys.argv[2]), len(text)
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024)
+"""
+
+def test_large_pdf_memory():
+    """Test that peak RSS stays bounded while OCR-ing a large scanned PDF"""
+    try:
+        pages = '120'
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            pdf_path = os.path.join(tmp_dir, 'large.pdf')
+            subprocess.run([sys.executable, '-c', GENERATE_LARGE_PDF, pdf_path, pages], check=True)
+            proc = subprocess.run(
+                [sys.executable, '-c', MEASURE_LARGE_PDF, pdf_path, pages],
+                cwd=project_root, capture_output=True, text=True
+            )
+        if proc.returncode != 0:
+            print(f"❌ Large PDF extraction failed: {proc.stderr.strip().splitlines()[-1]}")
+            return False
+
+        peak_mb = int(proc.stdout.split()[-1])
+        if peak_mb > LARGE_PDF_RSS_BUDGET_MB:
+            print(f"❌ Peak RSS {peak_mb} MB for {pages} pages (budget {LARGE_PDF_RSS_BUDGET_MB} MB)")
+            return False
+        print(f"✅ Peak RSS {peak_mb} MB for {pages} pages (budget {LARGE_PDF_RSS_BUDGET_MB} MB)")
+        return True
+    except Exception as e:
+        print(f"❌ Large PDF memory error: {e}")
+        return False
+
 def test_fastapi_app():
     """Test FastAPI app creation"""
     try:
@@ -79,8 +439,18 @@ def main():
     try:
         # Run tests
         tests = [
+            ("Import Time", test_import_time),
             ("Module Imports", test_imports),
             ("Database Initialization", test_database_initialization),
+            ("Database Path", test_database_path),
+            ("Analysis Cache", test_analysis_cache),
+            ("Partial OCR Status", test_partial_ocr_status),
+            ("Text Limit", test_text_limit),
+            ("Password Hashing", test_password_hashing),
+            ("Login Rate Limit", test_login_rate_limit),
+            ("Statistics", test_statistics),
+            ("Keyword Detection", test_keyword_detection),
+            ("Large PDF Memory", test_large_pdf_memory),
             ("FastAPI App", test_fastapi_app),
         ]
         
@@ -0,0 +1,73 @@
+"""
+Password hashing utilities
+bcrypt runs in a small dedicated thread pool so a login never blocks the
+event loop for the other requests served by the same worker
+"""
+
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+# bcrypt cost factor; existing hashes with a different cost are rehashed on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Threads hashing at the same time (bcrypt releases the GIL)
+AUTH_WORKERS = int(os.getenv("AUTH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Hashing jobs allowed to wait for a thread before new ones are refused
+AUTH_MAX_PENDING = int(os.getenv("AUTH_MAX_PENDING", "64"))
+
+class AuthBusyError(Exception):
+    """Raised when the hashing pool already has AUTH_MAX_PENDING jobs queued"""
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+_pending = 0
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Create the pool on first use, so it is never inherited across fork"""
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=AUTH_WORKERS, thread_name_prefix="auth")
+        return _executor
+
+def _hasher():
+    from passlib.hash import bcrypt
+    return bcrypt.using(rounds=BCRYPT_ROUNDS)
+
+def _hash(password: str) -> str:
+    return _hasher().hash(password)
+
+def _verify(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    hasher = _hasher()
+    if not hasher.verify(password, hashed):
+        return False, None
+    if hasher.needs_update(hashed):
+        return True, hasher.hash(password)
+    return True, None
+
+async def _run(func, *args):
+    global _pending
+    with _lock:
+        if _pending >= AUTH_MAX_PENDING:
+            raise AuthBusyError("Too many password hashing jobs queued")
+        _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), func, *args)
+    finally:
+        with _lock:
+            _pending -= 1
+
+async def hash_password(password: str) -> str:
+    """Hash a password with the configured cost factor"""
+    return await _run(_hash, password)
+
+async def verify_password(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password against a stored hash
+    Returns (valid, new_hash); new_hash is set when the stored hash uses a
+    different cost factor than BCRYPT_ROUNDS and should replace it
+    """
+    return await _run(_verify, password, hashed)
@@ -5,30 +5,49 @@ Document extraction utilities for analyzing PDF content
 import re
 from typing import Dict, Any
 
+from utils.fuzzy_match import FuzzyMatcher
+
+# Document types reported by extract_document_details, each "Ada" or "Tidak Ada"
+DOCUMENT_TYPES = (
+    "SPM", "DAFTAR_SP2D", "SP2D", "SPP", "SK", "SURAT_TUGAS", "BAPP", "BAST",
+    "BA_PEMBAYARAN", "SURAT_PERJANJIAN", "KONTRAK", "SPK", "SPMK", "KWITANSI", "INVOICE",
+)
+
+# Markers used to detect document types; matched OCR-tolerantly in one pass
+MARKERS = (
+    "SURAT PERINTAH MEMBAYAR", "DAFTAR SP2D SATKER", "SURAT PERINTAH PENCAIRAN DANA",
+    "SURAT PERMINTAAN PEMBAYARAN", "KEPUTUSAN", "MENIMBANG", "MENGINGAT", "MENETAPKAN",
+    "SURAT TUGAS", "MENUGASKAN", "MEMBERI TUGAS", "BERITA ACARA", "PENYELESAIAN PEKERJAAN",
+    "SERAH TERIMA", "PEMBAYARAN", "SURAT PERJANJIAN", "KONTRAK", "SURAT PERINTAH KERJA",
+    "SURAT PERINTAH MULAI KERJA", "KWITANSI", "KUITANSI", "INVOICE",
+)
+
+_MARKER_MATCHER = FuzzyMatcher(MARKERS)
+
 def extract_document_details(text: str) -> Dict[str, Any]:
     """
     Extract document details from text
     Returns a dictionary with all detected document types and their details
     """
-    upper_text = text.upper()
+    found = _MARKER_MATCHER.find(text)
     
     # Check document types
     status = {
-        "SPM": "Ada" if "SURAT PERINTAH MEMBAYAR" in upper_text else "Tidak Ada",
-        "DAFTAR_SP2D": "Ada" if "DAFTAR SP2D SATKER" in upper_text else "Tidak Ada",
-        "SP2D": "Ada" if "SURAT PERINTAH PENCAIRAN DANA" in upper_text else "Tidak Ada",
-        "SPP": "Ada" if "SURAT PERMINTAAN PEMBAYARAN" in upper_text else "Tidak Ada",
-        "SK": "Ada" if "KEPUTUSAN" in upper_text and all(k in text for k in ["Menimbang", "Mengingat", "Menetapkan"]) else "Tidak Ada",
-        "SURAT_TUGAS": "Ada" if "SURAT TUGAS" in upper_text and any(k in upper_text for k in ["MENUGASKAN", "MEMBERI TUGAS"]) else "Tidak Ada",
-        "BAPP": "Ada" if "BERITA ACARA" in upper_text and "PENYELESAIAN PEKERJAAN" in upper_text else "Tidak Ada",
-        "BAST": "Ada" if "BERITA ACARA" in upper_text and "SERAH TERIMA" in upper_text else "Tidak Ada",
-        "BA_PEMBAYARAN": "Ada" if "BERITA ACARA" in upper_text and "PEMBAYARAN" in upper_text else "Tidak Ada",
-        "SURAT_PERJANJIAN": "Ada" if "SURAT PERJANJIAN" in upper_text else "Tidak Ada",
-        "KONTRAK": "Ada" if "KONTRAK" in upper_text else "Tidak Ada",
-        "SPK": "Ada" if "SURAT PERINTAH KERJA" in upper_text else "Tidak Ada",
-        "SPMK": "Ada" if "SURAT PERINTAH MULAI KERJA" in upper_text else "Tidak Ada",
-        "KWITANSI": "Ada" if "KWITANSI" in upper_text or "KUITANSI" in upper_text else "Tidak Ada",
-        "INVOICE": "Ada" if "INVOICE" in upper_text else "Tidak Ada",
+        "SPM": "Ada" if "SURAT PERINTAH MEMBAYAR" in found else "Tidak Ada",
+        "DAFTAR_SP2D": "Ada" if "DAFTAR SP2D SATKER" in found else "Tidak Ada",
+        "SP2D": "Ada" if "SURAT PERINTAH PENCAIRAN DANA" in found else "Tidak Ada",
+        "SPP": "Ada" if "SURAT PERMINTAAN PEMBAYARAN" in found else "Tidak Ada",
+        "SK": "Ada" if "KEPUTUSAN" in found and all(k in found for k in ["MENIMBANG", "MENGINGAT", "MENETAPKAN"]) else "Tidak Ada",
+        "SURAT_TUGAS": "Ada" if "SURAT TUGAS" in found and any(k in found for k in ["MENUGASKAN", "MEMBERI TUGAS"]) else "Tidak Ada",
+        "BAPP": "Ada" if "BERITA ACARA" in found and "PENYELESAIAN PEKERJAAN" in found else "Tidak Ada",
+        "BAST": "Ada" if "BERITA ACARA" in found and "SERAH TERIMA" in found else "Tidak Ada",
+        "BA_PEMBAYARAN": "Ada" if "BERITA ACARA" in found and "PEMBAYARAN" in found else "Tidak Ada",
+        "SURAT_PERJANJIAN": "Ada" if "SURAT PERJANJIAN" in found else "Tidak Ada",
+        "KONTRAK": "Ada" if "KONTRAK" in found else "Tidak Ada",
+        "SPK": "Ada" if "SURAT PERINTAH KERJA" in found else "Tidak Ada",
+        "SPMK": "Ada" if "SURAT PERINTAH MULAI KERJA" in found else "Tidak Ada",
+        "KWITANSI": "Ada" if "KWITANSI" in found or "KUITANSI" in found else "Tidak Ada",
+        "INVOICE": "Ada" if "INVOICE" in found else "Tidak Ada",
     }
     
     # Extract details for each document type
@@ -116,32 +135,31 @@ def extract_detail_sp2d(text: str) -> Dict[str, str]:
     bank = ""
     jumlah = ""
 
-    if "SURAT PERINTAH PENCAIRAN DANA" in text.upper():
-        nomor_match = re.search(r'\d{5}/SP2D/\d{1,2}\.\d{2}\.\d{2}\.\d{2}/\d{4}', text)
-        if nomor_match:
-            nomor = nomor_match.group(0)
-
-        tanggal_match = re.search(r'(\d{1,2}\s(?:Januari|Februari|Maret|April|Mei|Juni|Juli|Agustus|September|Oktober|November|Desember)\s\d{4})', text, re.IGNORECASE)
-        if tanggal_match:
-            tanggal = tanggal_match.group(1)
-
-        npwp_match = re.search(r'\d{2}\.\d{3}\.\d{3}\.\d-\d{3}\.\d{3}', text)
-        if npwp_match:
-            npwp = npwp_match.group(0)
-
-        rekening_match = re.search(r'\d{3}-\d{2}-\d{7}-\d', text)
-        if rekening_match:
-            rekening = rekening_match.group(0)
-            rekening_pos = rekening_match.end()
-            sisa_text = text[rekening_pos:][:100]
-            
-            bank_match = re.search(r'BANK.*', sisa_text, re.IGNORECASE)
-            if bank_match:
-                bank = bank_match.group(0).strip()
-
-        jumlah_match = re.search(r'Jumlah yang dibayarkan\s*Rp[.: ]*\s*([\d\.]+,\d{2})', text, re.IGNORECASE)
-        if jumlah_match:
-            jumlah = jumlah_match.group(1).strip()
+    nomor_match = re.search(r'\d{5}/SP2D/\d{1,2}\.\d{2}\.\d{2}\.\d{2}/\d{4}', text)
+    if nomor_match:
+        nomor = nomor_match.group(0)
+
+    tanggal_match = re.search(r'(\d{1,2}\s(?:Januari|Februari|Maret|April|Mei|Juni|Juli|Agustus|September|Oktober|November|Desember)\s\d{4})', text, re.IGNORECASE)
+    if tanggal_match:
+        tanggal = tanggal_match.group(1)
+
+    npwp_match = re.search(r'\d{2}\.\d{3}\.\d{3}\.\d-\d{3}\.\d{3}', text)
+    if npwp_match:
+        npwp = npwp_match.group(0)
+
+    rekening_match = re.search(r'\d{3}-\d{2}-\d{7}-\d', text)
+    if rekening_match:
+        rekening = rekening_match.group(0)
+        rekening_pos = rekening_match.end()
+        sisa_text = text[rekening_pos:][:100]
+        
+        bank_match = re.search(r'BANK.*', sisa_text, re.IGNORECASE)
+        if bank_match:
+            bank = bank_match.group(0).strip()
+
+    jumlah_match = re.search(r'Jumlah yang dibayarkan\s*Rp[.: ]*\s*([\d\.]+,\d{2})', text, re.IGNORECASE)
+    if jumlah_match:
+        jumlah = jumlah_match.group(1).strip()
 
     return {
         "jenis_dokumen": jenis_dokumen,
@@ -0,0 +1,155 @@
+"""
+OCR-tolerant keyword matching
+
+Text and markers are normalized the same way: diacritics stripped, common
+OCR character confusions mapped, punctuation and whitespace collapsed to
+single spaces, and runs of single letters ("K U I T A N S I") joined. Markers
+are then matched word by word over the text's tokens in one pass. Each word
+may differ from its token by a bounded number of edits, found through a
+deletion-neighbourhood index instead of comparing every token with every
+marker word.
+"""
+
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Characters OCR commonly returns in place of letters (applied after upper())
+OCR_CONFUSIONS = str.maketrans({
+    "0": "O",
+    "1": "I",
+    "|": "I",
+    "!": "I",
+    "5": "S",
+    "$": "S",
+    "8": "B",
+})
+
+# Lowercase "l" read in place of "I" inside an uppercase word ("INVOlCE");
+# applied before upper() so ordinary lowercase words keep their "l"
+_LOWERCASE_L = re.compile(r"(?<=[A-Z])l|l(?=[A-Z])")
+_NON_ALNUM = re.compile(r"[^A-Z0-9]+")
+_SINGLE_LETTER_RUN = re.compile(r"\b[A-Z0-9](?: [A-Z0-9]){2,}\b")
+
+def normalize_text(text: str) -> str:
+    """
+    Uppercase, strip diacritics, apply OCR confusions, collapse punctuation
+    and whitespace to single spaces and join runs of 3+ single letters
+    """
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = _LOWERCASE_L.sub("I", text)
+    text = _NON_ALNUM.sub(" ", text.upper().translate(OCR_CONFUSIONS)).strip()
+    return _SINGLE_LETTER_RUN.sub(lambda match: match.group(0).replace(" ", ""), text)
+
+def default_max_errors(word: str) -> int:
+    """One edit allowed per 8 characters of a marker word"""
+    return len(word) // 8
+
+def _levenshtein(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j - 1] + (ca != cb), previous[j] + 1, current[j - 1] + 1))
+        previous = current
+    return previous[-1]
+
+def _deletions(word: str) -> Set[str]:
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+class FuzzyMatcher:
+    """
+    Find which of a fixed set of markers occur in a text
+
+    A marker matches a run of consecutive tokens whose i-th token is within
+    the i-th marker word's edit budget; a token may also extend a word with a
+    suffix ("PEMBAYARANNYA") if the word itself matches exactly. Glued
+    markers ("SURATPERINTAHKERJA") match only exactly, so edits never cross
+    a word boundary. max_errors overrides the per-word budget of a marker.
+    """
+
+    def __init__(self, markers: Iterable[str], max_errors: Optional[Dict[str, int]] = None):
+        max_errors = max_errors or {}
+        self.markers: Dict[str, Tuple[str, ...]] = {}
+        # word -> [(marker, position in marker)]
+        self._word_positions: Dict[str, List[Tuple[str, int]]] = {}
+        self._budgets: Dict[str, int] = {}
+        # word or deletion variant -> words it may come from
+        self._variants: Dict[str, Set[str]] = {}
+        # glued multi-word marker -> markers
+        self._glued: Dict[str, Set[str]] = {}
+
+        for marker in markers:
+            words = tuple(normalize_text(marker).split())
+            self.markers[marker] = words
+            for position, word in enumerate(words):
+                self._word_positions.setdefault(word, []).append((marker, position))
+                budget = max_errors.get(marker, default_max_errors(word))
+                self._budgets[word] = min(self._budgets.get(word, budget), budget)
+            if len(words) > 1:
+                self._glued.setdefault("".join(words), set()).add(marker)
+
+        for word, budget in self._budgets.items():
+            self._variants.setdefault(word, set()).add(word)
+            if budget:
+                for variant in _deletions(word):
+                    self._variants.setdefault(variant, set()).add(word)
+
+        fuzzy_lengths = [len(word) for word, budget in self._budgets.items() if budget]
+        self._fuzzy_range = (min(fuzzy_lengths) - 1, max(fuzzy_lengths) + 1) if fuzzy_lengths else (1, 0)
+        self._prefix_lengths = sorted({len(word) for word in self._budgets} | {len(glue) for glue in self._glued})
+
+    def _match_token(self, token: str) -> Tuple[Set[str], Set[str]]:
+        """Return (marker words token matches, glued markers token matches)"""
+        words: Set[str] = set()
+        glued: Set[str] = set()
+
+        # Exact word or glued marker, possibly followed by a suffix
+        for length in self._prefix_lengths:
+            if length > len(token):
+                break
+            prefix = token[:length]
+            if prefix in self._budgets:
+                words.add(prefix)
+            if prefix in self._glued:
+                glued |= self._glued[prefix]
+
+        # Words within their edit budget: token and marker word share a
+        # deletion variant, then the real distance is checked
+        if self._fuzzy_range[0] <= len(token) <= self._fuzzy_range[1]:
+            candidates: Set[str] = set()
+            for variant in _deletions(token) | {token}:
+                candidates |= self._variants.get(variant, set())
+            for word in candidates - words:
+                budget = self._budgets[word]
+                if budget and abs(len(word) - len(token)) <= budget and _levenshtein(word, token) <= budget:
+                    words.add(word)
+        return words, glued
+
+    def find(self, text: str, normalized: bool = False) -> Set[str]:
+        """Return the markers found in text (pass normalized=True if already normalized)"""
+        if not normalized:
+            text = normalize_text(text)
+
+        found: Set[str] = set()
+        # marker -> numbers of leading words matched by the runs ending at the previous token
+        active: Dict[str, Set[int]] = {}
+        for token in text.split():
+            words, glued = self._match_token(token)
+            found |= glued
+
+            progress: Dict[str, Set[int]] = {}
+            for word in words:
+                for marker, position in self._word_positions[word]:
+                    if position == 0 or position in active.get(marker, ()):
+                        if position + 1 == len(self.markers[marker]):
+                            found.add(marker)
+                        else:
+                            progress.setdefault(marker, set()).add(position + 1)
+            active = progress
+
+            if len(found) == len(self.markers):
+                break
+        return found
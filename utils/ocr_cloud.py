@@ -1,41 +1,130 @@
 """
 Cloud-based OCR utility for PDF text extraction
 Uses Google Cloud Vision API or similar cloud OCR service
+
+PyMuPDF and requests are imported inside the functions that need them so
+that importing this module stays cheap on serverless cold starts
+
+PyMuPDF does not support use from several threads, and the routes run
+extraction in a thread pool, so all PyMuPDF work goes through _FITZ_LOCK
+and a worker extracts one document at a time
 """
 
 import os
-import fitz  # PyMuPDF
+import math
 import base64
-import requests
-from typing import Optional
+import threading
+from typing import Callable, Optional, Tuple
 import json
 
+# Bump whenever extraction output changes, so cached results are recomputed
+EXTRACTOR_VERSION = "2"
+
+# Limits for processed PDFs (0 disables a limit)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MAX_PAGES = int(os.getenv("MAX_PAGES", "1000"))
+# Largest raster rendered for OCR; bigger pages are rendered at a lower zoom
+MAX_PAGE_PIXELS = int(os.getenv("MAX_PAGE_PIXELS", str(8_000_000)))
+# Extracted text kept in memory for one document
+MAX_TEXT_CHARS = int(os.getenv("MAX_TEXT_CHARS", str(5_000_000)))
+# Pages processed per chunk before the document is reopened
+OCR_CHUNK_PAGES = int(os.getenv("OCR_CHUNK_PAGES", "20"))
+OCR_ZOOM = 2.0
+
+# Reentrant so the public helpers can also be called while it is held
+_FITZ_LOCK = threading.RLock()
+
+class DocumentTooLargeError(Exception):
+    """Raised when a document exceeds a configured size limit"""
+
+def check_pdf_limits(pdf_path: str) -> int:
+    """
+    Check a PDF against MAX_PAGES and return its page count
+    The upload size is checked by the caller while copying the file
+    """
+    import fitz  # PyMuPDF
+    
+    with _FITZ_LOCK, fitz.open(pdf_path) as doc:
+        page_count = len(doc)
+    if MAX_PAGES and page_count > MAX_PAGES:
+        raise DocumentTooLargeError(f"Dokumen memiliki {page_count} halaman, melebihi batas {MAX_PAGES} halaman")
+    return page_count
+
 def extract_text_from_pdf(pdf_path: str) -> str:
     """
     Extract text from PDF using cloud OCR service
     Falls back to PyMuPDF text extraction if cloud OCR is not available
+    Raises DocumentTooLargeError if the PDF exceeds the configured limits
     """
+    return extract_text_with_status(pdf_path)[0]
+
+def extract_text_with_status(pdf_path: str) -> Tuple[str, bool]:
+    """
+    Same as extract_text_from_pdf, also reporting whether every page produced
+    text. OCR services return "" for a failed page, so an incomplete result
+    must not be cached.
+    """
+    with _FITZ_LOCK:
+        return _extract_text_with_status(pdf_path)
+
+def _extract_text_with_status(pdf_path: str) -> Tuple[str, bool]:
+    check_pdf_limits(pdf_path)
+    
     try:
         # First try to extract text directly from PDF (for text-based PDFs)
         text = extract_text_direct(pdf_path)
         if text.strip():
-            return text
+            return text, True
         
         # If no text found, use cloud OCR
-        return extract_text_with_cloud_ocr(pdf_path)
+        failed_pages = []
+        
+        def page_text(page) -> str:
+            result = ocr_page(page)
+            if not result.strip():
+                failed_pages.append(page.number)
+            return result
+        
+        text = extract_pages_in_chunks(pdf_path, page_text)
+        return text, not failed_pages
         
+    except DocumentTooLargeError:
+        raise
     except Exception as e:
         print(f"Error extracting text from PDF: {e}")
-        return ""
+        return "", False
+
+def extract_pages_in_chunks(pdf_path: str, page_text: Callable[..., str]) -> str:
+    """
+    Run page_text(page) over every page, OCR_CHUNK_PAGES pages at a time
+    The document is reopened for each chunk so MuPDF's per-document state
+    does not grow with the page count. Raises DocumentTooLargeError once the
+    text exceeds MAX_TEXT_CHARS.
+    """
+    import fitz  # PyMuPDF
+    
+    with _FITZ_LOCK:
+        with fitz.open(pdf_path) as doc:
+            page_count = len(doc)
+        chunk_pages = max(1, OCR_CHUNK_PAGES)
+        
+        texts = []
+        total_chars = 0
+        for first_page in range(0, page_count, chunk_pages):
+            with fitz.open(pdf_path) as doc:
+                for page_num in range(first_page, min(first_page + chunk_pages, page_count)):
+                    texts.append(page_text(doc[page_num]))
+                    total_chars += len(texts[-1])
+                    if MAX_TEXT_CHARS and total_chars > MAX_TEXT_CHARS:
+                        raise DocumentTooLargeError(f"Teks dokumen melebihi batas {MAX_TEXT_CHARS} karakter")
+        return "".join(texts)
 
 def extract_text_direct(pdf_path: str) -> str:
     """Extract text directly from PDF using PyMuPDF"""
     try:
-        with fitz.open(pdf_path) as doc:
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            return text
+        return extract_pages_in_chunks(pdf_path, lambda page: page.get_text())
+    except DocumentTooLargeError:
+        raise
     except Exception as e:
         print(f"Error in direct text extraction: {e}")
         return ""
@@ -46,27 +135,42 @@ def extract_text_with_cloud_ocr(pdf_path: str) -> str:
     Currently uses a mock implementation - replace with actual cloud OCR service
     """
     try:
-        # Convert PDF to images and extract text
-        with fitz.open(pdf_path) as doc:
-            text = ""
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # Higher resolution
-                
-                # Convert to base64 for API call
-                img_data = pix.tobytes("png")
-                img_base64 = base64.b64encode(img_data).decode()
-                
-                # Call cloud OCR service (mock implementation)
-                page_text = call_cloud_ocr(img_base64)
-                text += page_text + "\n"
-                
-        return text
+        return extract_pages_in_chunks(pdf_path, ocr_page)
         
+    except DocumentTooLargeError:
+        raise
     except Exception as e:
         print(f"Error in cloud OCR: {e}")
         return ""
 
+def ocr_page(page) -> str:
+    """
+    Render one page and send it to the cloud OCR service
+    Each raster buffer is released as soon as the next representation exists,
+    so only the base64 payload is alive while the request is in flight
+    """
+    import fitz  # PyMuPDF
+    
+    # Higher resolution, reduced if the page would exceed MAX_PAGE_PIXELS
+    zoom = OCR_ZOOM
+    area = page.rect.width * page.rect.height
+    if MAX_PAGE_PIXELS and area * zoom * zoom > MAX_PAGE_PIXELS:
+        zoom = math.sqrt(MAX_PAGE_PIXELS / area)
+    
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+    img_data = pix.tobytes("png")
+    pix = None
+    # Scanned pages each decode their own large image; drop it from MuPDF's
+    # resource cache instead of letting the cache fill to its 256 MB default
+    fitz.TOOLS.store_shrink(100)
+    
+    # Convert to base64 for API call
+    img_base64 = base64.b64encode(img_data).decode()
+    img_data = None
+    
+    # Call cloud OCR service (mock implementation)
+    return call_cloud_ocr(img_base64) + "\n"
+
 def call_cloud_ocr(img_base64: str) -> str:
     """
     Call cloud OCR service
@@ -94,6 +198,8 @@ def call_cloud_ocr(img_base64: str) -> str:
 def call_ocrspace_api(img_base64: str, api_key: str) -> str:
     """Call OCR.space API"""
     try:
+        import requests
+        
         url = "https://api.ocr.space/parse/image"
         payload = {
             'apikey': api_key,
@@ -154,6 +260,8 @@ def extract_text_simple(pdf_path: str) -> str:
     This is a fallback that doesn't require external services
     """
     try:
+        import fitz  # PyMuPDF
+        
         with fitz.open(pdf_path) as doc:
             text = ""
             for page in doc: